@@ -1,229 +1,174 @@
 """Streamlit frontend for Vietnamese Legal RAG Assistant."""
+import json
+import re
+import time
+from pathlib import Path
+from typing import Iterator
+
 import httpx
 import streamlit as st
 
 API_BASE_URL = "http://localhost:8000"
+STYLES_PATH = Path(__file__).parent / "styles.css"
+HISTORY_PAGE_SIZE = 50
+STREAM_FLUSH_INTERVAL = 0.05  # seconds between answer re-renders while streaming
+STREAM_FLUSH_MIN_CHARS = 8  # new characters required before a re-render
 
 st.set_page_config(page_title="Trợ lý Pháp lý AI", page_icon="⚖️", layout="wide")
 
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Be+Vietnam+Pro:wght@400;500;600;700&display=swap');
-    
-    * { font-family: 'Be Vietnam Pro', sans-serif; }
-    
-    .stApp { background: linear-gradient(135deg, #f8fafc 0%, #f1f5f9 100%); }
-    
-    .main-title {
-        font-size: 2.5em;
-        font-weight: 700;
-        background: linear-gradient(135deg, #1e40af 0%, #3b82f6 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        text-align: center;
-        margin-bottom: 0.2em;
-    }
-    
-    .subtitle {
-        color: #64748b;
-        text-align: center;
-        font-size: 1em;
-        margin-bottom: 2em;
-    }
-    
-    .source-item {
-        background: #fff;
-        border-radius: 10px;
-        padding: 14px 16px;
-        margin-bottom: 10px;
-        border: 1px solid #e2e8f0;
-        transition: all 0.15s ease;
-    }
-    
-    .source-item:hover {
-        border-color: #3b82f6;
-        box-shadow: 0 4px 12px rgba(59,130,246,0.1);
-    }
-    
-    .source-header {
-        display: flex;
-        align-items: center;
-        gap: 10px;
-        margin-bottom: 8px;
-    }
-    
-    .source-num {
-        background: linear-gradient(135deg, #1e40af 0%, #3b82f6 100%);
-        color: #fff;
-        min-width: 24px;
-        height: 24px;
-        border-radius: 6px;
-        display: inline-flex;
-        align-items: center;
-        justify-content: center;
-        font-size: 0.75em;
-        font-weight: 600;
-    }
-    
-    .source-title {
-        font-weight: 600;
-        color: #1e293b;
-        font-size: 0.9em;
-        flex: 1;
-        line-height: 1.3;
-    }
-    
-    .score-pill {
-        font-size: 0.7em;
-        font-weight: 600;
-        padding: 3px 8px;
-        border-radius: 12px;
-        white-space: nowrap;
-    }
-    
-    .score-high { background: #dcfce7; color: #166534; }
-    .score-med { background: #dbeafe; color: #1e40af; }
-    .score-low { background: #fef3c7; color: #92400e; }
-    
-    .source-meta {
-        display: flex;
-        flex-wrap: wrap;
-        gap: 6px;
-        margin-bottom: 8px;
-    }
-    
-    .meta-chip {
-        font-size: 0.7em;
-        background: #f1f5f9;
-        color: #475569;
-        padding: 2px 8px;
-        border-radius: 4px;
-        font-weight: 500;
-    }
-    
-    .source-excerpt {
-        font-size: 0.82em;
-        color: #475569;
-        line-height: 1.6;
-        background: #f8fafc;
-        padding: 10px 12px;
-        border-radius: 6px;
-        border-left: 3px solid #3b82f6;
-        max-height: 120px;
-        overflow-y: auto;
-    }
-    
-    .stChatMessage { background: transparent; }
-    
-    [data-testid="stSidebar"] {
-        background: #fff;
-        border-right: 1px solid #e5e7eb;
-    }
-    
-    .stButton > button {
-        background: linear-gradient(135deg, #2563eb 0%, #3b82f6 100%);
-        color: #fff;
-        border: none;
-        border-radius: 8px;
-        font-weight: 500;
-        transition: all 0.2s;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-1px);
-        box-shadow: 0 4px 12px rgba(37,99,235,0.3);
-    }
-    
-    .status-dot {
-        width: 8px;
-        height: 8px;
-        border-radius: 50%;
-        display: inline-block;
-        margin-right: 6px;
-    }
-    
-    .status-on { background: #10b981; box-shadow: 0 0 6px #10b981; }
-    .status-off { background: #ef4444; }
-    
-    details summary { cursor: pointer; }
-    
-    .sources-container {
-        max-height: 400px;
-        overflow-y: auto;
-        padding-right: 4px;
-    }
-</style>
-""", unsafe_allow_html=True)
+
+@st.cache_data
+def load_css() -> str:
+    """Read and minify the stylesheet once per process instead of on every rerun."""
+    css = STYLES_PATH.read_text(encoding="utf-8")
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};])\s*", r"\1", css).strip()
+    return f"<style>{css}</style>"
 
 
+st.markdown(load_css(), unsafe_allow_html=True)
+
 st.markdown('<h1 class="main-title">⚖️ Trợ lý Pháp lý AI</h1>', unsafe_allow_html=True)
 st.markdown('<p class="subtitle">Hybrid Search + ViRanker Reranking • Powered by Gemini</p>', unsafe_allow_html=True)
 
 
+@st.cache_resource
+def get_client() -> httpx.Client:
+    """Shared HTTP client so keep-alive connections survive Streamlit reruns."""
+    return httpx.Client(
+        base_url=API_BASE_URL,
+        timeout=120.0,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    )
+
+
+@st.cache_data(ttl=10, show_spinner=False)
 def check_api_health() -> bool:
     try:
-        return httpx.get(f"{API_BASE_URL}/health", timeout=3.0).status_code == 200
+        return get_client().get("/health", timeout=3.0).status_code == 200
     except Exception:
         return False
 
 
-def send_chat_request(query: str, history: list, temperature: float) -> dict | None:
+def _render_source_card(idx: int, title: str, article_ref: str, law_id: str, content: str, percent: int) -> str:
+    """Build the HTML for a single source card."""
+    # Score styling
+    if percent >= 70:
+        score_class, score_text = "score-high", f"✓ {percent}%"
+    elif percent >= 50:
+        score_class, score_text = "score-med", f"{percent}%"
+    else:
+        score_class, score_text = "score-low", f"{percent}%"
+    
+    # Build meta chips
+    meta_chips = []
+    if article_ref:
+        meta_chips.append(f'<span class="meta-chip">📌 {article_ref}</span>')
+    if law_id:
+        meta_chips.append(f'<span class="meta-chip">📜 {law_id}</span>')
+    meta_html = "".join(meta_chips)
+    
+    return f'''
+    <div class="source-item">
+        <div class="source-header">
+            <span class="source-num">{idx + 1}</span>
+            <span class="source-title">{title}</span>
+            <span class="score-pill {score_class}">{score_text}</span>
+        </div>
+        <div class="source-meta">{meta_html}</div>
+        <div class="source-excerpt">{content}</div>
+    </div>
+    '''
+
+
+def build_sources_html(sources: list) -> str:
+    """Build compact source cards as a single HTML block."""
+    cards = [
+        _render_source_card(
+            idx,
+            src.get("title", "Văn bản pháp luật")[:80],
+            src.get("article_ref", ""),
+            src.get("law_id", ""),
+            src.get("content", ""),
+            round(src.get("relevance_score", 0.5) * 100),
+        )
+        for idx, src in enumerate(sources)
+    ]
+    return '<div class="sources-container">' + "".join(cards) + '</div>'
+
+
+def render_sources(sources_html: str, count: int, expanded: bool = True) -> None:
+    """Render a pre-built sources block inside an expander."""
+    with st.expander(f"📚 Nguồn tham khảo ({count})", expanded=expanded):
+        st.markdown(sources_html, unsafe_allow_html=True)
+
+
+class StreamError(Exception):
+    """Error frame sent by the API after the stream has started."""
+
+
+def _iter_answer(resp: httpx.Response, message: dict, sources_slot) -> Iterator[str]:
+    """Yield coalesced answer text from the SSE stream, rendering sources as they arrive."""
+    buffer, last_flush = "", time.monotonic()
+    for line in resp.iter_lines():
+        if not line.startswith("data: "):
+            continue
+        event = json.loads(line[len("data: "):])
+        
+        if event["type"] == "sources" and event.get("data"):
+            # Built once here and kept with the message for later reruns
+            message["sources_html"] = build_sources_html(event["data"])
+            message["source_count"] = len(event["data"])
+            with sources_slot:
+                render_sources(message["sources_html"], message["source_count"])
+        elif event["type"] == "token":
+            buffer += event["data"]
+            # Coalesce tokens: at most ~20 re-renders/s, never for tiny deltas
+            now = time.monotonic()
+            if len(buffer) >= STREAM_FLUSH_MIN_CHARS and now - last_flush >= STREAM_FLUSH_INTERVAL:
+                yield buffer
+                buffer, last_flush = "", now
+        elif event["type"] == "error":
+            raise StreamError(event.get("data", ""))
+    
+    if buffer:
+        yield buffer
+
+
+def stream_chat_response(query: str, history: list, temperature: float) -> dict | None:
+    """Stream the answer into the current chat message and return it as a history entry."""
+    answer_slot = st.empty()
+    sources_slot = st.container()
+    answer_slot.markdown("🔍 Đang tìm kiếm...")
+    
+    message = {"role": "assistant", "content": "", "sources_html": "", "source_count": 0}
     try:
-        with httpx.Client(timeout=120.0) as client:
-            resp = client.post(f"{API_BASE_URL}/chat", json={
-                "query": query, "history": history, "temperature": temperature
-            })
+        with get_client().stream("POST", "/chat/stream", json={
+            "query": query, "history": history, "temperature": temperature
+        }) as resp:
             resp.raise_for_status()
-            return resp.json()
+            with answer_slot.container():
+                message["content"] = st.write_stream(_iter_answer(resp, message, sources_slot))
     except httpx.TimeoutException:
         st.error("⏱️ Timeout - Vui lòng thử lại")
+        return None
     except httpx.HTTPStatusError as e:
         st.error(f"❌ Lỗi API: {e.response.status_code}")
+        return None
+    except StreamError as e:
+        st.error(f"❌ Lỗi API: {e}")
+        return None
     except Exception as e:
         st.error(f"❌ Lỗi kết nối: {e}")
-    return None
+        return None
+    
+    return message
 
 
-def render_sources(sources: list) -> None:
-    """Render compact source cards."""
-    st.markdown('<div class="sources-container">', unsafe_allow_html=True)
-    
-    for idx, src in enumerate(sources):
-        score = src.get("relevance_score", 0.5)
-        title = src.get("title", "Văn bản pháp luật")[:80]
-        article_ref = src.get("article_ref", "")
-        law_id = src.get("law_id", "")
-        content = src.get("content", "")
-        
-        # Score styling
-        if score >= 0.7:
-            score_class, score_text = "score-high", f"✓ {score*100:.0f}%"
-        elif score >= 0.5:
-            score_class, score_text = "score-med", f"{score*100:.0f}%"
-        else:
-            score_class, score_text = "score-low", f"{score*100:.0f}%"
-        
-        # Build meta chips
-        meta_chips = []
-        if article_ref:
-            meta_chips.append(f'<span class="meta-chip">📌 {article_ref}</span>')
-        if law_id:
-            meta_chips.append(f'<span class="meta-chip">📜 {law_id}</span>')
-        meta_html = "".join(meta_chips)
-        
-        st.markdown(f'''
-        <div class="source-item">
-            <div class="source-header">
-                <span class="source-num">{idx + 1}</span>
-                <span class="source-title">{title}</span>
-                <span class="score-pill {score_class}">{score_text}</span>
-            </div>
-            <div class="source-meta">{meta_html}</div>
-            <div class="source-excerpt">{content}</div>
-        </div>
-        ''', unsafe_allow_html=True)
-    
-    st.markdown('</div>', unsafe_allow_html=True)
+def _load_earlier() -> None:
+    """Widen the rendered history window by one page."""
+    st.session_state.visible_msgs += HISTORY_PAGE_SIZE
 
 
 # Session state
@@ -231,6 +176,8 @@ if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 if "api_history" not in st.session_state:
     st.session_state.api_history = []
+if "visible_msgs" not in st.session_state:
+    st.session_state.visible_msgs = HISTORY_PAGE_SIZE
 
 # Sidebar
 with st.sidebar:
@@ -240,6 +187,9 @@ with st.sidebar:
     dot_class = "status-on" if api_online else "status-off"
     status = "Online" if api_online else "Offline"
     st.markdown(f'<p><span class="status-dot {dot_class}"></span>API: <b>{status}</b></p>', unsafe_allow_html=True)
+    if st.button("🔄 Kiểm tra lại", use_container_width=True):
+        check_api_health.clear()
+        st.rerun()
     
     st.divider()
     temperature = st.slider("Temperature", 0.0, 1.0, 0.1, 0.05)
@@ -257,12 +207,18 @@ with st.sidebar:
     if st.button("🗑️ Xóa lịch sử", use_container_width=True):
         st.session_state.chat_history = []
         st.session_state.api_history = []
+        st.session_state.visible_msgs = HISTORY_PAGE_SIZE
         st.rerun()
 
-# Chat history
-for msg in st.session_state.chat_history:
+# Chat history (only the most recent window is rendered)
+if len(st.session_state.chat_history) > st.session_state.visible_msgs:
+    st.button("⬆️ Xem tin nhắn cũ hơn", on_click=_load_earlier)
+
+for msg in st.session_state.chat_history[-st.session_state.visible_msgs:]:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
+        if msg.get("sources_html"):
+            render_sources(msg["sources_html"], msg["source_count"], expanded=False)
 
 # Chat input
 if query := st.chat_input("Nhập câu hỏi ..."):
@@ -278,17 +234,8 @@ if query := st.chat_input("Nhập câu hỏi ..."):
         st.markdown(query)
     
     with st.chat_message("assistant"):
-        with st.spinner("🔍 Đang tìm kiếm..."):
-            response = send_chat_request(query, st.session_state.api_history, temperature)
+        message = stream_chat_response(query, st.session_state.api_history, temperature)
         
-        if response:
-            answer = response.get("answer", "")
-            sources = response.get("sources", [])
-            
-            st.markdown(answer)
-            st.session_state.chat_history.append({"role": "assistant", "content": answer})
-            st.session_state.api_history.append({"role": "assistant", "content": answer})
-            
-            if sources:
-                with st.expander(f"📚 Nguồn tham khảo ({len(sources)})", expanded=True):
-                    render_sources(sources)
+        if message and message["content"]:
+            st.session_state.chat_history.append(message)
+            st.session_state.api_history.append({"role": "assistant", "content": message["content"]})
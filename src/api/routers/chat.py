@@ -1,42 +1,60 @@
 """Chat API router with streaming support."""
-import json
+import asyncio
+import heapq
 import logging
 from typing import AsyncGenerator
 
+import orjson
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from langchain_core.messages import HumanMessage, AIMessage
 
 from src.api.schemas import (
     ChatRequest, ChatResponse, SourceDocument, StreamingChatRequest,
     extract_article_reference, smart_truncate
 )
+from src.core.config import settings
 from src.rag.chain import get_rag_chain, get_streaming_rag_chain
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
+_MESSAGE_TYPES = {"user": HumanMessage, "assistant": AIMessage}
+
+
 def _convert_history(history: list) -> list[HumanMessage | AIMessage]:
-    """Convert API history to LangChain messages."""
-    return [
-        HumanMessage(content=m.content) if m.role == "user" else AIMessage(content=m.content)
-        for m in history
-    ]
+    """Convert the most recent API history to LangChain messages."""
+    window = history[-settings.max_history_messages:] if settings.max_history_messages else history
+    return [_MESSAGE_TYPES.get(m.role, AIMessage)(content=m.content) for m in window]
+
+
+_MAX_SOURCES = 10
+
+
+def _relevance(doc) -> float:
+    """Relevance score (already normalized 0-1 from ViRanker), clamped."""
+    score = doc.metadata.get("relevance_score", 0.5)
+    if isinstance(score, (int, float)):
+        return max(0.0, min(1.0, float(score)))
+    return 0.5
 
 
 def _extract_sources(documents: list) -> list[SourceDocument]:
     """Extract unique, well-formatted source documents."""
-    seen, sources = set(), []
+    best: dict[str, SourceDocument] = {}
     
-    for doc in documents:
+    # Only the highest scored documents are formatted
+    for doc in heapq.nlargest(_MAX_SOURCES, documents, key=_relevance):
         meta = doc.metadata
         parent_id = meta.get("parent_id") or meta.get("_id") or ""
+        score = _relevance(doc)
         
-        # Deduplicate
-        if parent_id in seen:
+        # Deduplicate, keeping the highest scored chunk per parent
+        existing = best.get(parent_id)
+        if existing and existing.relevance_score >= score:
             continue
-        seen.add(parent_id)
         
         # Extract content and article reference
         content = doc.page_content
@@ -58,24 +76,17 @@ def _extract_sources(documents: list) -> list[SourceDocument]:
             # Format: "luat-123" -> "Luật 123"
             law_id = law_id.replace("-", " ").replace("_", " ").title()
         
-        # Get relevance score (already normalized 0-1 from ViRanker)
-        score = meta.get("relevance_score", 0.5)
-        if isinstance(score, (int, float)):
-            score = max(0.0, min(1.0, float(score)))
-        else:
-            score = 0.5
-        
-        sources.append(SourceDocument(
+        # Fields are built and clamped here, so skip re-validation
+        best[parent_id] = SourceDocument.model_construct(
             content=smart_truncate(content, 400),
             title=title[:150] if title else "Văn bản pháp luật",
             article_ref=article_ref,
             law_id=law_id,
             relevance_score=score,
-        ))
+        )
     
     # Sort by relevance score
-    sources.sort(key=lambda s: s.relevance_score, reverse=True)
-    return sources
+    return sorted(best.values(), key=lambda s: s.relevance_score, reverse=True)
 
 
 @router.post("", response_model=ChatResponse)
@@ -88,7 +99,7 @@ async def chat(request: ChatRequest) -> ChatResponse:
             "chat_history": _convert_history(request.history),
         })
         
-        return ChatResponse(
+        return ChatResponse.model_construct(
             answer=result.get("answer", ""),
             sources=_extract_sources(result.get("context", [])),
         )
@@ -97,45 +108,64 @@ async def chat(request: ChatRequest) -> ChatResponse:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(payload: dict) -> bytes:
+    """Encode a payload as a Server-Sent Events frame."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+_SOURCES_ADAPTER = TypeAdapter(list[SourceDocument])
+
+
+def _sources_frame(documents: list) -> bytes:
+    """Extract sources and serialize them straight to an SSE frame."""
+    sources = _SOURCES_ADAPTER.dump_json(_extract_sources(documents))
+    return b'data: {"type":"sources","data":' + sources + b"}\n\n"
+
+
 async def _stream_response(
     query: str, chat_history: list, temperature: float | None
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """Generate SSE streaming response."""
-    chain = get_streaming_rag_chain(temperature)
     sources_sent = False
     
-    async for event in chain.astream_events(
-        {"input": query, "chat_history": chat_history}, version="v2"
-    ):
-        kind = event.get("event")
-        
-        if kind == "on_retriever_end" and not sources_sent:
-            docs = event.get("data", {}).get("output", [])
-            sources = [s.model_dump() for s in _extract_sources(docs)]
-            yield f"data: {json.dumps({'type': 'sources', 'data': sources}, ensure_ascii=False)}\n\n"
-            sources_sent = True
-        
-        if kind == "on_chat_model_stream":
-            chunk = event.get("data", {}).get("chunk")
-            if chunk and getattr(chunk, "content", None):
-                yield f"data: {json.dumps({'type': 'token', 'data': chunk.content}, ensure_ascii=False)}\n\n"
+    # The 200 status is already sent once streaming starts, so failures are
+    # reported to the client as an error frame instead of an HTTP error
+    try:
+        chain = get_streaming_rag_chain(temperature)
+        async for event in chain.astream_events(
+            {"input": query, "chat_history": chat_history}, version="v2"
+        ):
+            kind = event.get("event")
+            
+            if kind == "on_retriever_end" and not sources_sent:
+                docs = event.get("data", {}).get("output", [])
+                # Format sources off the event loop so token streaming isn't stalled
+                yield await asyncio.to_thread(_sources_frame, docs)
+                sources_sent = True
+            
+            # Before retrieval ends, model tokens belong to the history-aware
+            # question rewrite, not the answer
+            if kind == "on_chat_model_stream" and sources_sent:
+                chunk = event.get("data", {}).get("chunk")
+                if chunk and getattr(chunk, "content", None):
+                    yield _sse({"type": "token", "data": chunk.content})
+    except Exception as e:
+        logger.exception("Streaming error")
+        yield _sse({"type": "error", "data": str(e)})
+        return
     
-    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+    yield _sse({"type": "done"})
 
 
 @router.post("/stream")
 async def chat_stream(request: StreamingChatRequest) -> StreamingResponse:
     """Stream legal question response with SSE."""
-    try:
-        return StreamingResponse(
-            _stream_response(
-                request.query,
-                _convert_history(request.history),
-                request.temperature,
-            ),
-            media_type="text/event-stream",
-            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-        )
-    except Exception as e:
-        logger.exception("Streaming error")
-        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        _stream_response(
+            request.query,
+            _convert_history(request.history),
+            request.temperature,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+    )
@@ -1,37 +1,67 @@
 """Ingestion API router."""
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from fastapi import APIRouter, HTTPException, Query
 
 from src.api.schemas import IngestRequest, IngestResponse
 from src.rag.ingestion import ingest_documents
 from src.core.config import settings
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
-ingestion_status: dict = {"running": False, "result": None}
+
+# Ingestion is long and CPU/GPU heavy: keep it off the shared threadpool
+# used by sync endpoints and run_in_threadpool.
+_ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+
+
+@dataclass
+class IngestState:
+    """Ingestion status shared between requests, mutated on the event loop only."""
+    running: bool = False
+    result: dict | None = None
+    version: int = 0  # Bumped on every start/finish so clients can spot a new run
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def snapshot(self) -> dict:
+        return {"running": self.running, "result": self.result, "version": self.version}
+
+
+ingestion_state = IngestState()
 
 
-def _run_ingestion(batch_size: int, max_workers: int) -> None:
-    """Background ingestion task."""
-    global ingestion_status
+def _finish_ingestion(future: asyncio.Future) -> None:
+    """Publish the ingestion result (runs on the event loop)."""
     try:
-        ingestion_status["result"] = ingest_documents(batch_size, max_workers)
+        result = future.result()
     except Exception as e:
-        ingestion_status["result"] = {"status": "error", "message": str(e)}
-    finally:
-        ingestion_status["running"] = False
+        result = {"status": "error", "message": str(e)}
+    ingestion_state.result = result
+    ingestion_state.running = False
+    ingestion_state.version += 1
+    ingestion_state.done.set()
 
 
 @router.post("", response_model=IngestResponse)
-async def trigger_ingest(request: IngestRequest, background_tasks: BackgroundTasks) -> IngestResponse:
+async def trigger_ingest(request: IngestRequest) -> IngestResponse:
     """Trigger background document ingestion."""
-    global ingestion_status
-    
-    if ingestion_status["running"]:
-        raise HTTPException(status_code=409, detail="Ingestion already in progress")
-    
-    ingestion_status = {"running": True, "result": None}
-    background_tasks.add_task(_run_ingestion, request.batch_size, request.max_workers)
-    
-    return IngestResponse(
+    async with ingestion_state.lock:
+        if ingestion_state.running:
+            raise HTTPException(status_code=409, detail="Ingestion already in progress")
+
+        ingestion_state.running = True
+        ingestion_state.result = None
+        ingestion_state.version += 1
+        ingestion_state.done.clear()
+
+    future = asyncio.get_running_loop().run_in_executor(
+        _ingest_executor, ingest_documents, request.batch_size, request.max_workers
+    )
+    future.add_done_callback(_finish_ingestion)
+
+    return IngestResponse.model_construct(
         status="started",
         total_raw_documents=0,
         total_child_documents=0,
@@ -43,4 +73,17 @@ async def trigger_ingest(request: IngestRequest, background_tasks: BackgroundTas
 @router.get("/status")
 async def get_ingestion_status() -> dict:
     """Get current ingestion status."""
-    return ingestion_status
+    # All writes happen synchronously on the event loop, so a snapshot taken
+    # here can never observe a half-applied update and needs no lock
+    return ingestion_state.snapshot()
+
+
+@router.get("/wait")
+async def wait_for_ingestion(timeout: float = Query(default=300.0, gt=0, le=3600)) -> dict:
+    """Wait until the running ingestion finishes (or timeout), then return its status."""
+    if ingestion_state.running:
+        try:
+            await asyncio.wait_for(ingestion_state.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+    return await get_ingestion_status()
@@ -1,11 +1,14 @@
 """Pydantic models for API request/response validation."""
 import re
+from functools import lru_cache
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
 class ChatMessage(BaseModel):
     """Single chat message."""
-    role: str = Field(..., pattern="^(user|assistant)$")
+    role: Literal["user", "assistant"]
     content: str
 
 
@@ -39,7 +42,7 @@ class ChatResponse(BaseModel):
 
 
 class StreamChunk(BaseModel):
-    """Single streaming chunk."""
+    """Single streaming chunk (documents the SSE frame shape; frames are encoded directly)."""
     type: str = Field(..., pattern="^(sources|token|done)$")
     data: str | list[SourceDocument] | None = None
 
@@ -66,23 +69,26 @@ class HealthResponse(BaseModel):
     version: str
 
 
+_ARTICLE_REF_PATTERNS = [
+    re.compile(r"(Điều\s+\d+[a-zA-Z]?)", re.IGNORECASE),
+    re.compile(r"(Khoản\s+\d+)", re.IGNORECASE),
+    re.compile(r"(Điểm\s+[a-zA-Z])", re.IGNORECASE),
+]
+
+
+@lru_cache(maxsize=4096)
 def extract_article_reference(text: str) -> str:
     """Extract Điều/Khoản reference from text."""
-    patterns = [
-        r"(Điều\s+\d+[a-zA-Z]?)",
-        r"(Khoản\s+\d+)",
-        r"(Điểm\s+[a-zA-Z])",
-    ]
-    
     refs = []
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in _ARTICLE_REF_PATTERNS:
+        match = pattern.search(text)
         if match:
             refs.append(match.group(1))
     
     return ", ".join(refs) if refs else ""
 
 
+@lru_cache(maxsize=2048)
 def smart_truncate(text: str, max_length: int = 500) -> str:
     """Truncate text at sentence boundary."""
     if len(text) <= max_length:
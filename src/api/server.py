@@ -3,10 +3,25 @@ import uvicorn
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from src.core.config import settings
 from src.api.schemas import HealthResponse
 from src.api.routers import chat_router, ingest_router
+from src.rag.retriever import close_retriever_async_client
+
+# Responses that must reach the client unbuffered
+_UNCOMPRESSED_PATHS = frozenset({"/chat/stream"})
+
+
+class StreamSafeGZipMiddleware(GZipMiddleware):
+    """GZip that bypasses SSE routes; older Starlette compresses text/event-stream."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in _UNCOMPRESSED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
 
 
 @asynccontextmanager
@@ -17,6 +32,7 @@ async def lifespan(app: FastAPI):
     print(f"📦 Collection: {settings.qdrant_collection}")
     yield
     print("👋 Shutting down Legal RAG API...")
+    await close_retriever_async_client()
 
 
 app = FastAPI(
@@ -35,21 +51,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses (chat answers + source excerpts); the SSE route is
+# skipped explicitly so tokens are not buffered on any supported Starlette
+app.add_middleware(StreamSafeGZipMiddleware, minimum_size=1024)
+
 # Include routers
 app.include_router(chat_router)
 app.include_router(ingest_router)
 
 
+_HEALTH = HealthResponse.model_construct(status="healthy", version=app.version)
+
+
 @app.get("/", response_model=HealthResponse)
 async def health_check() -> HealthResponse:
     """Health check endpoint."""
-    return HealthResponse(status="healthy", version="0.3.0")
+    return _HEALTH
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health() -> HealthResponse:
     """Alias for health check."""
-    return HealthResponse(status="healthy", version="0.3.0")
+    return _HEALTH
 
 
 def main():
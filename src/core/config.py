@@ -23,21 +23,30 @@ class Settings(BaseSettings):
     # --- Qdrant Configuration ---
     qdrant_url: str = "http://localhost:6333"
     qdrant_collection: str = "legal_hybrid_v3"
+    qdrant_grpc_port: int = 6334
+    qdrant_prefer_grpc: bool = True  # Protobuf over HTTP/2 instead of REST/JSON
 
     # --- Embedding Models ---
     dense_model: str = "GreenNode/GreenNode-Embedding-Large-VN-Mixed-V1"
     sparse_model: str = "Qdrant/bm25"
     embedding_device: str = "cuda"
+    embedding_dtype: str = "float16"  # float16 | bfloat16 | float32 (forced on CPU)
+    embedding_batch_size: int = 256  # Texts per embedding forward pass
 
     # --- Reranker Configuration ---
     reranker_model: str = "namdp-ptit/ViRanker"
     reranker_device: str = "cuda"
     reranker_top_n: int = 5
+    reranker_batch_size: int = 16  # Pairs per forward pass, grouped by length
+    reranker_cpu_int8: bool = True  # Dynamic INT8 quantization when running on CPU
 
     # --- LLM Configuration ---
     google_api_key: str
     llm_model: str = "gemini-2.5-flash-lite"
     llm_temperature: float = 0.1
+    max_history_messages: int = 20  # Most recent chat messages sent to the LLM (0 = all)
+    llm_cache_enabled: bool = True  # Exact-match response cache for /chat
+    llm_cache_max_mb: int = 256  # Cache file is reset at startup once larger than this
 
     # --- Retrieval Configuration ---
     retrieval_top_k: int = 30  # Initial retrieval before reranking
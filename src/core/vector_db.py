@@ -1,10 +1,14 @@
 """Qdrant Vector Store with Hybrid Search (Dense + Sparse)."""
+import uuid
+import hashlib
 from functools import lru_cache
 
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_qdrant import QdrantVectorStore, FastEmbedSparse, RetrievalMode
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, SparseVectorParams
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http.models import (
+    Distance, VectorParams, SparseVectorParams, HnswConfigDiff, OptimizersConfigDiff,
+)
 
 from .config import settings
 
@@ -12,22 +16,44 @@ from .config import settings
 @lru_cache
 def get_dense_embedding() -> HuggingFaceEmbeddings:
     """Initialize dense embedding model (GreenNode)."""
+    # Half precision only pays off on GPU; CPU kernels stay in float32
+    dtype = "float32" if settings.embedding_device == "cpu" else settings.embedding_dtype
     return HuggingFaceEmbeddings(
         model_name=settings.dense_model,
-        model_kwargs={"device": settings.embedding_device, "trust_remote_code": True},
-        encode_kwargs={"normalize_embeddings": True},
+        model_kwargs={
+            "device": settings.embedding_device,
+            "trust_remote_code": True,
+            "model_kwargs": {"torch_dtype": dtype},
+        },
+        encode_kwargs={"batch_size": settings.embedding_batch_size, "normalize_embeddings": True},
     )
 
 
 @lru_cache
 def get_sparse_embedding() -> FastEmbedSparse:
     """Initialize sparse embedding model (BM25)."""
-    return FastEmbedSparse(model_name=settings.sparse_model)
+    return FastEmbedSparse(model_name=settings.sparse_model, batch_size=settings.embedding_batch_size)
 
 
+@lru_cache
 def get_qdrant_client() -> QdrantClient:
-    """Get Qdrant client instance."""
-    return QdrantClient(url=settings.qdrant_url)
+    """Get shared Qdrant client (gRPC for point traffic when enabled)."""
+    return QdrantClient(
+        url=settings.qdrant_url,
+        prefer_grpc=settings.qdrant_prefer_grpc,
+        grpc_port=settings.qdrant_grpc_port,
+        timeout=120,
+    )
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Create an async Qdrant client; not cached since it is bound to the running event loop."""
+    return AsyncQdrantClient(
+        url=settings.qdrant_url,
+        prefer_grpc=settings.qdrant_prefer_grpc,
+        grpc_port=settings.qdrant_grpc_port,
+        timeout=120,
+    )
 
 
 def ensure_collection_exists(client: QdrantClient, collection_name: str) -> None:
@@ -46,6 +72,60 @@ def ensure_collection_exists(client: QdrantClient, collection_name: str) -> None
     )
 
 
+def parent_collection_name(collection_name: str | None = None) -> str:
+    """Name of the payload-only collection holding parent chunks."""
+    return f"{collection_name or settings.qdrant_collection}_parents"
+
+
+def ensure_parent_collection_exists(client: QdrantClient, collection_name: str) -> None:
+    """Create vectorless parent collection if not exists."""
+    if client.collection_exists(collection_name):
+        return
+    
+    client.create_collection(collection_name=collection_name, vectors_config={})
+
+
+def make_point_id(key: str) -> str:
+    """Deterministic UUID point id from a string key (BLAKE2b-128)."""
+    return str(uuid.UUID(bytes=hashlib.blake2b(key.encode(), digest_size=16).digest()))
+
+
+# Qdrant defaults, used when a previous bulk ingest was interrupted before
+# the original values could be restored
+_DEFAULT_HNSW_M = 16
+_DEFAULT_INDEXING_THRESHOLD = 10000
+
+
+def begin_bulk_ingest(client: QdrantClient, collection_name: str) -> tuple[int, int]:
+    """
+    Pause HNSW graph building so bulk upserts only append points.
+    
+    Returns:
+        The collection's (hnsw m, indexing_threshold) to pass to end_bulk_ingest.
+    """
+    config = client.get_collection(collection_name).config
+    m = config.hnsw_config.m
+    threshold = config.optimizer_config.indexing_threshold
+    if (m, threshold) == (0, 0) or threshold is None:
+        m, threshold = m or _DEFAULT_HNSW_M, threshold or _DEFAULT_INDEXING_THRESHOLD
+    
+    client.update_collection(
+        collection_name=collection_name,
+        hnsw_config=HnswConfigDiff(m=0),
+        optimizer_config=OptimizersConfigDiff(indexing_threshold=0),
+    )
+    return m, threshold
+
+
+def end_bulk_ingest(client: QdrantClient, collection_name: str, m: int, indexing_threshold: int) -> None:
+    """Restore HNSW indexing; Qdrant then builds the graph once in the background."""
+    client.update_collection(
+        collection_name=collection_name,
+        hnsw_config=HnswConfigDiff(m=m),
+        optimizer_config=OptimizersConfigDiff(indexing_threshold=indexing_threshold),
+    )
+
+
 def get_vector_store(collection_name: str | None = None) -> QdrantVectorStore:
     """
     Get QdrantVectorStore with Hybrid Search enabled.
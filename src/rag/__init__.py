@@ -1,6 +1,17 @@
-from .retriever import get_hybrid_retriever
-from .chain import get_rag_chain
-from .ingestion import ingest_documents
+from importlib import import_module
 
-__all__ = ["get_hybrid_retriever", "get_rag_chain", "ingest_documents"]
+# Resolved on first access so importing a light submodule (split workers
+# load src.rag.splitter) does not pull in torch or the LLM chain
+_EXPORTS = {
+    "get_hybrid_retriever": ".retriever",
+    "get_rag_chain": ".chain",
+    "ingest_documents": ".ingestion",
+}
 
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
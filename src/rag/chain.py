@@ -1,28 +1,28 @@
 """LLM Generation Chain with template-based prompts."""
 from functools import lru_cache
 
+from langchain_community.cache import SQLiteCache
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import Runnable
+from langchain_core.runnables import Runnable, RunnablePassthrough
 
 from src.core.config import settings
 from src.rag.retriever import get_hybrid_retriever
 
 
-def _load_template(name: str) -> str:
-    """Load prompt template from file."""
-    path = settings.templates_dir / name
-    return path.read_text(encoding="utf-8")
+# Prompt templates are immutable, so read them once at import
+_CONTEXTUALIZE_TEMPLATE = (settings.templates_dir / "contextualize.jinja").read_text(encoding="utf-8")
+_QA_TEMPLATE = (settings.templates_dir / "qa_system.jinja").read_text(encoding="utf-8")
 
 
 @lru_cache
 def _get_contextualize_prompt() -> ChatPromptTemplate:
     """Build contextualize prompt for history-aware retrieval."""
-    system = _load_template("contextualize.jinja")
     return ChatPromptTemplate.from_messages([
-        ("system", system),
+        ("system", _CONTEXTUALIZE_TEMPLATE),
         MessagesPlaceholder("chat_history"),
         ("human", "{input}"),
     ])
@@ -31,14 +31,25 @@ def _get_contextualize_prompt() -> ChatPromptTemplate:
 @lru_cache
 def _get_qa_prompt() -> ChatPromptTemplate:
     """Build QA prompt with context variable."""
-    system = _load_template("qa_system.jinja")
     return ChatPromptTemplate.from_messages([
-        ("system", system),
+        ("system", _QA_TEMPLATE),
         MessagesPlaceholder("chat_history"),
         ("human", "{input}"),
     ])
 
 
+@lru_cache
+def _get_llm_cache() -> SQLiteCache | None:
+    """Exact-match LLM response cache persisted under the data directory."""
+    if not settings.llm_cache_enabled:
+        return None
+    path = settings.data_dir / "llm_cache.db"
+    # Entries never expire, so start over once the file outgrows its budget
+    if path.exists() and path.stat().st_size > settings.llm_cache_max_mb * 1024 * 1024:
+        path.unlink()
+    return SQLiteCache(database_path=str(path))
+
+
 def _create_llm(temperature: float | None = None, streaming: bool = False) -> ChatGoogleGenerativeAI:
     """Create LLM instance."""
     return ChatGoogleGenerativeAI(
@@ -47,9 +58,17 @@ def _create_llm(temperature: float | None = None, streaming: bool = False) -> Ch
         google_api_key=settings.google_api_key,
         convert_system_message_to_human=True,
         streaming=streaming,
+        # Cache hits emit no stream events, so only the non-streaming chain is cached
+        cache=None if streaming else _get_llm_cache(),
     )
 
 
+def _format_docs(inputs: dict) -> str:
+    """Join retrieved documents into the prompt context."""
+    docs: list[Document] = inputs["context"]
+    return "\n\n".join(d.page_content for d in docs)
+
+
 def _build_chain(llm: ChatGoogleGenerativeAI) -> Runnable:
     """Build RAG chain with given LLM."""
     retriever = get_hybrid_retriever()
@@ -58,16 +77,34 @@ def _build_chain(llm: ChatGoogleGenerativeAI) -> Runnable:
         llm, retriever, _get_contextualize_prompt()
     )
     
-    qa_chain = create_stuff_documents_chain(llm, _get_qa_prompt())
+    # Same output as create_stuff_documents_chain, without its per-document
+    # prompt formatting pass
+    qa_chain = (
+        RunnablePassthrough.assign(context=_format_docs)
+        | _get_qa_prompt()
+        | llm
+        | StrOutputParser()
+    )
     
     return create_retrieval_chain(history_aware_retriever, qa_chain)
 
 
+@lru_cache(maxsize=32)
+def _get_chain(temperature: float | None, streaming: bool) -> Runnable:
+    """Build and cache a RAG chain per (temperature, streaming) pair."""
+    return _build_chain(_create_llm(temperature, streaming=streaming))
+
+
+def _cache_key(temperature: float | None) -> float | None:
+    """Round temperature so near-identical values share a cached chain."""
+    return None if temperature is None else round(temperature, 2)
+
+
 def get_rag_chain(temperature: float | None = None) -> Runnable:
     """Get RAG chain for standard (non-streaming) usage."""
-    return _build_chain(_create_llm(temperature, streaming=False))
+    return _get_chain(_cache_key(temperature), False)
 
 
 def get_streaming_rag_chain(temperature: float | None = None) -> Runnable:
     """Get RAG chain with streaming enabled."""
-    return _build_chain(_create_llm(temperature, streaming=True))
+    return _get_chain(_cache_key(temperature), True)
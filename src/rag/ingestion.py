@@ -1,207 +1,240 @@
 """Document ingestion with Vietnamese legal text splitting."""
-import re
-import uuid
+import asyncio
+import multiprocessing
 import concurrent.futures
-from typing import Iterator
-from itertools import islice
+from functools import partial
+from typing import Iterable, Iterator
+from itertools import chain, islice
 
-from langchain_text_splitters import TextSplitter
 from langchain_core.documents import Document
 from datasets import load_dataset
 from tqdm import tqdm
 
-from src.core.config import settings
-from src.core.vector_db import get_vector_store
-
+from qdrant_client.http.models import PointStruct, SparseVector
 
-class VietnameseLegalTextSplitter(TextSplitter):
-    """Vietnamese legal document splitter by Điều/Khoản structure."""
+from src.core.config import settings
+from src.core.vector_db import (
+    get_qdrant_client, ensure_collection_exists, get_dense_embedding, get_sparse_embedding,
+    get_async_qdrant_client, begin_bulk_ingest, end_bulk_ingest,
+    parent_collection_name, ensure_parent_collection_exists, make_point_id,
+)
+from src.rag.splitter import split_document
+
+# Splitting workers must not fork the API process (threads, CUDA context)
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+_SPLIT_CHUNKSIZE = 32
+# One embedding forward at a time: concurrent full-size batches on the GPU
+# multiply activation memory, only the upserts fan out to max_workers
+_EMBED_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-embed")
+
+
+def _batched(items: Iterable[Document], size: int) -> Iterator[list[Document]]:
+    """Yield lists of up to `size` items from any iterable."""
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _create_child_documents(documents: Iterable[Document], max_workers: int) -> Iterator[Document]:
+    """Split documents across worker processes, yielding child documents in order."""
+    # Map a bounded window at a time so split results never pile up unconsumed
+    window = max_workers * _SPLIT_CHUNKSIZE * 4
+    split = partial(
+        split_document,
+        parent_chunk=(settings.parent_chunk_size, settings.parent_chunk_overlap),
+        child_chunk=(settings.child_chunk_size, settings.child_chunk_overlap),
+    )
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=_MP_CONTEXT) as executor:
+        for docs in _batched(documents, window):
+            for children in executor.map(split, docs, chunksize=_SPLIT_CHUNKSIZE):
+                yield from children
+
+
+def _format_row(row: dict) -> Document:
+    """Convert one corpus row into a Document."""
+    return Document(
+        page_content=f"{row['title']}\n{row['text']}",
+        metadata={
+            "_id": row["_id"],
+            "law_id": row["_id"].split("+")[0],
+            "title": row["title"],
+        }
+    )
+
+
+def load_legal_corpus() -> Iterator[Document]:
+    """Stream Vietnamese legal corpus from HuggingFace."""
+    try:
+        ds = load_dataset(
+            "GreenNode/zalo-ai-legal-text-retrieval-vn", "corpus", split="corpus", streaming=True
+        )
+    except Exception as e:
+        print(f"❌ Failed to load dataset: {e}")
+        return iter(())
+    
+    print("🔄 Streaming dataset...")
+    return map(_format_row, ds)
 
-    def __init__(self, chunk_size: int = 1500, chunk_overlap: int = 200):
-        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        self._article_re = re.compile(r"(Điều\s+\d+[a-zA-Z]?\.?\s*[^\n]*)", re.IGNORECASE)
-        self._clause_re = re.compile(r"(\d+\.\s+)")
-        self._chapter_re = re.compile(r"(Chương\s+[IVXLCDM\d]+\.?\s*[^\n]*)", re.IGNORECASE)
 
-    def split_text(self, text: str) -> list[str]:
-        chunks = []
-        for article in self._split_by_articles(text):
-            if len(article) <= self.chunk_size:
-                chunks.append(article.strip())
-            else:
-                chunks.extend(self._split_by_clauses(article))
-        
-        chunks = [c for c in chunks if c.strip()]
-        return self._merge_small_chunks(chunks)
+def _point_id(doc: Document) -> str:
+    """Deterministic point id, so re-ingesting a chunk overwrites it instead of duplicating."""
+    return make_point_id(f"{doc.metadata['parent_id']}:{doc.metadata['chunk_index']}")
 
-    def _split_by_articles(self, text: str) -> list[str]:
-        matches = list(self._article_re.finditer(text))
-        if not matches:
-            return [text] if text.strip() else []
-        
-        splits, chapter = [], ""
-        ch_match = self._chapter_re.search(text[:matches[0].start()])
-        if ch_match:
-            chapter = ch_match.group(1).strip() + "\n\n"
-        
-        for i, m in enumerate(matches):
-            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-            article = text[m.start():end].strip()
-            if chapter:
-                article = chapter + article
-            
-            ch_match = self._chapter_re.search(text[m.start():end])
-            if ch_match:
-                chapter = ch_match.group(1).strip() + "\n\n"
-            splits.append(article)
-        
-        return splits
 
-    def _split_by_clauses(self, article: str) -> list[str]:
-        lines = article.split("\n")
-        header, start = "", 0
-        
-        for i, line in enumerate(lines):
-            if self._article_re.match(line.strip()):
-                header, start = line.strip() + "\n", i + 1
-                break
-        
-        remaining = "\n".join(lines[start:])
-        clause_matches = list(self._clause_re.finditer(remaining))
-        
-        if not clause_matches:
-            return self._fallback_split(article)
-        
-        chunks = []
-        for i, m in enumerate(clause_matches):
-            end = clause_matches[i + 1].start() if i + 1 < len(clause_matches) else len(remaining)
-            chunk = header + remaining[m.start():end].strip() if header else remaining[m.start():end].strip()
-            
-            if len(chunk) <= self.chunk_size:
-                chunks.append(chunk)
-            else:
-                chunks.extend(self._fallback_split(chunk))
-        
-        return chunks
+def _embed_points(docs: list[Document]) -> list[PointStruct]:
+    """Embed documents (dense + sparse) and build Qdrant points in LangChain payload layout."""
+    texts = [d.page_content for d in docs]
+    dense = get_dense_embedding().embed_documents(texts)
+    sparse = get_sparse_embedding().embed_documents(texts)
+    
+    return [
+        PointStruct(
+            id=_point_id(doc),
+            vector={
+                "dense": d_vec,
+                "sparse": SparseVector(indices=s_vec.indices, values=s_vec.values),
+            },
+            payload={
+                "page_content": doc.page_content,
+                # Parent text is stored once in the parent collection
+                "metadata": {k: v for k, v in doc.metadata.items() if k != "parent_content"},
+            },
+        )
+        for doc, d_vec, s_vec in zip(docs, dense, sparse)
+    ]
 
-    def _fallback_split(self, text: str) -> list[str]:
-        sentences = re.split(r"(?<=[.!?])\s+", text)
-        chunks, current = [], ""
-        
-        for s in sentences:
-            if len(current) + len(s) + 1 <= self.chunk_size:
-                current += (" " if current else "") + s
-            else:
-                if current:
-                    chunks.append(current.strip())
-                current = s
-        
-        if current:
-            chunks.append(current.strip())
-        return chunks
 
-    def _merge_small_chunks(self, chunks: list[str], min_size: int = 100) -> list[str]:
-        if not chunks:
-            return chunks
+def _parent_points(docs: list[Document]) -> list[PointStruct]:
+    """Build one vectorless point per distinct parent referenced by the children."""
+    parents: dict[str, PointStruct] = {}
+    for doc in docs:
+        meta = doc.metadata
+        if meta["parent_id"] in parents:
+            continue
         
-        merged, buffer = [], ""
-        for chunk in chunks:
-            if len(chunk) < min_size:
-                buffer = buffer + "\n\n" + chunk if buffer else chunk
-            else:
-                if buffer:
-                    merged.append(buffer)
-                    buffer = ""
-                merged.append(chunk)
-        
-        if buffer:
-            if merged:
-                merged[-1] += "\n\n" + buffer
-            else:
-                merged.append(buffer)
-        return merged
-
-
-def _create_child_documents(
-    documents: list[Document],
-    parent_splitter: VietnameseLegalTextSplitter,
-    child_splitter: VietnameseLegalTextSplitter,
-) -> Iterator[Document]:
-    """Create child documents with parent content in metadata."""
-    for doc in documents:
-        for p_idx, parent in enumerate(parent_splitter.split_text(doc.page_content)):
-            parent_id = f"{doc.metadata.get('_id', '')}_{p_idx}"
+        parents[meta["parent_id"]] = PointStruct(
+            id=make_point_id(meta["parent_id"]),
+            vector={},
+            payload={
+                "page_content": meta["parent_content"],
+                "metadata": {k: v for k, v in meta.items() if k not in ("parent_content", "chunk_index")},
+            },
+        )
+    return list(parents.values())
+
+
+async def _upload_children(
+    documents: Iterable[Document], batch_size: int, max_workers: int
+) -> tuple[int, int]:
+    """Embed and upsert child documents with at most `max_workers` batches in flight."""
+    aclient = get_async_qdrant_client()
+    sem = asyncio.Semaphore(max_workers)
+    parents_collection = parent_collection_name()
+    embed_batch_size = max(batch_size, settings.embedding_batch_size)
+    loop = asyncio.get_running_loop()
+
+    async def batch_ingest(batch: list[Document]) -> int:
+        # Embed the whole batch in one call so the model runs full-size
+        # forward passes, then upsert pre-computed vectors in batch_size slices
+        try:
+            try:
+                points = await loop.run_in_executor(_EMBED_EXECUTOR, _embed_points, batch)
+            except Exception as e:
+                print(f"⚠️ Embedding error: {e}")
+                return 0
             
-            for c_idx, child in enumerate(child_splitter.split_text(parent)):
-                yield Document(
-                    page_content=child,
-                    metadata={
-                        **doc.metadata,
-                        "parent_id": parent_id,
-                        "parent_content": parent,
-                        "chunk_index": c_idx,
-                    }
+            # Children of a parent are contiguous, so a parent spanning two
+            # batches is upserted twice under the same id at worst
+            try:
+                await aclient.upsert(
+                    collection_name=parents_collection, points=_parent_points(batch), wait=False
                 )
-
-
-def load_legal_corpus() -> list[Document]:
-    """Load Vietnamese legal corpus from HuggingFace."""
+            except Exception as e:
+                # Children without their parents would silently answer from
+                # 512-char child text, so drop the whole batch instead
+                print(f"⚠️ Parent batch error, skipping {len(batch)} children: {e}")
+                return 0
+            
+            ingested = 0
+            for chunk in _batched(points, batch_size):
+                try:
+                    await aclient.upsert(
+                        collection_name=settings.qdrant_collection, points=chunk, wait=False
+                    )
+                    ingested += len(chunk)
+                except Exception as e:
+                    print(f"⚠️ Batch error: {e}")
+            return ingested
+        finally:
+            sem.release()
+
+    print(f"🚀 Embedding batches of {embed_batch_size}, upserting {batch_size} with {max_workers} workers")
+    
+    # Upserts use wait=False: Qdrant acknowledges once the points are in its
+    # write-ahead log instead of after they are applied to segments.
+    # Splitting is blocking, so pull each batch off the event loop; acquiring
+    # the semaphore before scheduling keeps memory bounded by in-flight batches
+    child_docs = _create_child_documents(documents, max_workers)
+    batches = iter(tqdm(_batched(child_docs, embed_batch_size), desc="Ingesting"))
+    tasks, total_children = [], 0
     try:
-        ds = load_dataset("GreenNode/zalo-ai-legal-text-retrieval-vn", "corpus", split="corpus")
-    except Exception as e:
-        print(f"❌ Failed to load dataset: {e}")
-        return []
+        while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+            await sem.acquire()
+            total_children += len(batch)
+            tasks.append(asyncio.create_task(batch_ingest(batch)))
+        ingested = sum(await asyncio.gather(*tasks))
+    finally:
+        await aclient.close()
     
-    print("🔄 Processing dataset...")
-    return [
-        Document(
-            page_content=f"{row['title']}\n{row['text']}",
-            metadata={
-                "_id": row["_id"],
-                "law_id": row["_id"].split("+")[0],
-                "title": row["title"],
-            }
-        ) for row in tqdm(ds, desc="Formatting")
-    ]
+    return total_children, ingested
 
 
 def ingest_documents(batch_size: int = 100, max_workers: int = 4) -> dict:
     """Parallel ingestion pipeline."""
     print(f"🔌 Connecting to Qdrant: {settings.qdrant_collection}")
     
-    vector_store = get_vector_store()
-    parent_splitter = VietnameseLegalTextSplitter(settings.parent_chunk_size, settings.parent_chunk_overlap)
-    child_splitter = VietnameseLegalTextSplitter(settings.child_chunk_size, settings.child_chunk_overlap)
+    client = get_qdrant_client()
+    ensure_collection_exists(client, settings.qdrant_collection)
+    ensure_parent_collection_exists(client, parent_collection_name())
 
     raw_docs = load_legal_corpus()
-    if not raw_docs:
+    first = next(raw_docs, None)
+    if first is None:
         return {"status": "failed", "error": "No documents loaded"}
 
-    print("📝 Splitting with Vietnamese legal structure...")
-    child_docs = list(_create_child_documents(raw_docs, parent_splitter, child_splitter))
-    print(f"📊 Generated {len(child_docs)} chunks from {len(raw_docs)} documents")
+    # The corpus is streamed, so count raw documents as the pipeline pulls them
+    total_raw = 0
 
-    def batch_ingest(batch):
-        try:
-            vector_store.add_documents(batch, ids=[str(uuid.uuid4()) for _ in batch])
-            return len(batch)
-        except Exception as e:
-            print(f"⚠️ Batch error: {e}")
-            return 0
-
-    batches = list(iter(lambda it=iter(child_docs): list(islice(it, batch_size)), []))
-    print(f"🚀 Ingesting {len(batches)} batches with {max_workers} workers")
+    def counted_docs() -> Iterator[Document]:
+        nonlocal total_raw
+        for doc in chain([first], raw_docs):
+            total_raw += 1
+            yield doc
+
+    # Load both models before uploads fan out: lru_cache does not stop
+    # concurrent first calls from each building their own instance
+    get_dense_embedding()
+    get_sparse_embedding()
+
+    print("📝 Splitting with Vietnamese legal structure...")
+    
+    index_config = begin_bulk_ingest(client, settings.qdrant_collection)
+    try:
+        # Runs in the API's ingest thread or the CLI, neither of which has a loop
+        total_children, total = asyncio.run(_upload_children(counted_docs(), batch_size, max_workers))
+    finally:
+        end_bulk_ingest(client, settings.qdrant_collection, *index_config)
+        print("🧱 Indexing resumed; Qdrant builds the HNSW graph in the background")
     
-    total = 0
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(batch_ingest, b) for b in batches]
-        for f in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Ingesting"):
-            total += f.result()
+    print(f"📊 Generated {total_children} chunks from {total_raw} documents")
 
     return {
-        "status": "success",
-        "total_raw_documents": len(raw_docs),
-        "total_child_documents": len(child_docs),
+        # Failed batches are skipped whole, so any shortfall means missing chunks
+        "status": "success" if total == total_children else "partial",
+        "total_raw_documents": total_raw,
+        "total_child_documents": total_children,
         "ingested": total,
         "collection": settings.qdrant_collection,
     }
@@ -1,6 +1,8 @@
 """Hybrid retrieval with ViRanker reranking."""
+import time
 import asyncio
-import math
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from typing import Any
 
@@ -10,73 +12,305 @@ from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.documents import Document
 from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import Fusion, FusionQuery, Prefetch, SparseVector
 
 from src.core.config import settings
-from src.core.vector_db import get_vector_store, get_dense_embedding
+from src.core.vector_db import (
+    get_vector_store, get_dense_embedding, get_sparse_embedding, get_async_qdrant_client,
+    parent_collection_name, make_point_id,
+)
 
+logger = logging.getLogger(__name__)
 
-def _sigmoid(x: float) -> float:
-    """Convert logit to probability."""
-    return 1 / (1 + math.exp(-x))
+# Model calls get their own threads instead of the loop's shared default
+# executor; one rerank thread since the cross-encoder shares one device
+_EMBED_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="embed")
+_RERANK_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
 
 
 class ViRanker:
     """Vietnamese cross-encoder reranker."""
     
-    def __init__(self, model_name: str, device: str = "cuda"):
+    def __init__(self, model_name: str, device: str = "cuda", batch_size: int = 16):
         self.device = torch.device(device if torch.cuda.is_available() else "cpu")
+        self.batch_size = batch_size
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_length = 512
+        self._num_special = self.tokenizer.num_special_tokens_to_add(pair=True)
+        self._use_token_types = "token_type_ids" in self.tokenizer.model_input_names
         self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
         self.model.to(self.device)
         self.model.eval()
+        
+        # FP16 on GPU doubles tensor-core throughput; scores are computed in fp32
+        if self.device.type == "cuda":
+            self.model.half()
+        # INT8 weights for the Linear layers: on CPU these dominate latency
+        # and dynamic quantization needs no calibration data
+        elif self.device.type == "cpu" and settings.reranker_cpu_int8:
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
     
-    def predict(self, pairs: list[tuple[str, str]]) -> list[float]:
+    def _encode_pair(self, q_ids: list[int], d_ids: list[int]) -> dict:
+        """Build model inputs for one pair, truncated like the tokenizer's longest_first."""
+        overflow = len(q_ids) + len(d_ids) + self._num_special - self.max_length
+        if overflow > 0:
+            # Trim the longer side down to the shorter one, then split the rest evenly
+            diff = min(overflow, abs(len(q_ids) - len(d_ids)))
+            rest = overflow - diff
+            if len(q_ids) > len(d_ids):
+                q_cut, d_cut = diff + rest // 2, rest - rest // 2
+            else:
+                q_cut, d_cut = rest // 2, diff + rest - rest // 2
+            q_ids, d_ids = q_ids[:len(q_ids) - q_cut], d_ids[:len(d_ids) - d_cut]
+        
+        features = {"input_ids": self.tokenizer.build_inputs_with_special_tokens(q_ids, d_ids)}
+        if self._use_token_types:
+            features["token_type_ids"] = self.tokenizer.create_token_type_ids_from_sequences(q_ids, d_ids)
+        return features
+    
+    def predict(self, pairs: list[tuple[str, str]], batch_size: int | None = None) -> list[float]:
         """Predict normalized relevance scores (0-1) for query-document pairs."""
         if not pairs:
             return []
+        batch_size = batch_size or self.batch_size
+        
+        # Tokenize each distinct query once and all documents in one call,
+        # then assemble pairs at the id level
+        queries = list(dict.fromkeys(q for q, _ in pairs))
+        query_ids = dict(zip(queries, self.tokenizer(queries, add_special_tokens=False)["input_ids"]))
+        doc_ids = self.tokenizer([d for _, d in pairs], add_special_tokens=False)["input_ids"]
+        encoded = [self._encode_pair(query_ids[q], d) for (q, _), d in zip(pairs, doc_ids)]
         
-        queries, documents = zip(*pairs)
-        inputs = self.tokenizer(
-            list(queries), list(documents),
-            padding=True, truncation=True, max_length=512,
-            return_tensors="pt"
-        ).to(self.device)
+        # Group pairs of similar token length so each minibatch pads to a
+        # short max length instead of the longest pair overall
+        order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]["input_ids"]))
+        scores = [0.0] * len(pairs)
         
-        with torch.no_grad():
-            logits = self.model(**inputs).logits.squeeze(-1)
-            raw_scores = [logits.item()] if logits.dim() == 0 else logits.tolist()
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            inputs = self.tokenizer.pad(
+                [encoded[i] for i in idx], return_tensors="pt"
+            ).to(self.device)
+            
+            with torch.inference_mode():
+                logits = self.model(**inputs).logits
+                # Normalize logits to 0-1 with one sigmoid over the whole batch
+                probs = torch.sigmoid(logits.float()).reshape(-1).tolist()
+            
+            for i, p in zip(idx, probs):
+                scores[i] = p
         
-        # Normalize logits to 0-1 using sigmoid
-        return [_sigmoid(s) for s in raw_scores]
+        return scores
 
 
 @lru_cache
 def get_reranker() -> ViRanker:
     """Get cached reranker instance."""
-    return ViRanker(settings.reranker_model, settings.reranker_device)
+    return ViRanker(settings.reranker_model, settings.reranker_device, settings.reranker_batch_size)
+
+
+class BatchedReranker:
+    """Coalesce concurrent async rerank calls into shared forward passes."""
+    
+    def __init__(self, reranker: ViRanker, max_batch: int = 128):
+        self.reranker = reranker
+        self.max_batch = max_batch
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+    
+    async def predict(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """Queue pairs for the next coalesced batch and wait for their scores."""
+        if not pairs:
+            return []
+        
+        loop = asyncio.get_running_loop()
+        # Queue and worker are bound to the loop that first used them
+        if self._loop is not loop or self._worker.done():
+            self._loop, self._queue = loop, asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        await self._queue.put((pairs, future))
+        return await future
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            
+            # Only take requests that are already waiting: a lone query runs
+            # immediately, and those arriving during a forward pass queue up
+            # for the next one
+            while size < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                batch.append(item)
+                size += len(item[0])
+            
+            # One forward per coalesced set rather than reranker_batch_size
+            # slices, otherwise coalescing saves no model calls
+            pairs = [pair for item_pairs, _ in batch for pair in item_pairs]
+            try:
+                scores = await loop.run_in_executor(
+                    _RERANK_EXECUTOR, self.reranker.predict, pairs, self.max_batch
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            start = 0
+            for item_pairs, future in batch:
+                end = start + len(item_pairs)
+                if not future.done():
+                    future.set_result(scores[start:end])
+                start = end
+
+
+@lru_cache
+def get_batched_reranker(reranker: ViRanker) -> BatchedReranker:
+    """Get the shared request-coalescing wrapper for a reranker."""
+    return BatchedReranker(reranker)
+
+
+@lru_cache
+def get_retriever_async_client() -> AsyncQdrantClient:
+    """Get the async Qdrant client shared by retrievals on the API event loop."""
+    return get_async_qdrant_client()
+
+
+async def close_retriever_async_client() -> None:
+    """Close the shared async client, if one was created."""
+    if get_retriever_async_client.cache_info().currsize:
+        await get_retriever_async_client().close()
+        get_retriever_async_client.cache_clear()
+
+
+@lru_cache(maxsize=1024)
+def _embed_dense_query(query: str) -> tuple[float, ...]:
+    """Dense query embedding, cached for repeated queries."""
+    return tuple(get_dense_embedding().embed_query(query))
+
+
+@lru_cache(maxsize=1024)
+def _embed_sparse_query(query: str) -> SparseVector:
+    """Sparse (BM25) query embedding, cached for repeated queries."""
+    vector = get_sparse_embedding().embed_query(query)
+    return SparseVector(indices=vector.indices, values=vector.values)
+
+
+def _hybrid_query(
+    collection_name: str, dense: tuple[float, ...], sparse: SparseVector, limit: int
+) -> dict:
+    """query_points arguments for dense + sparse retrieval fused with RRF."""
+    return {
+        "collection_name": collection_name,
+        "prefetch": [
+            Prefetch(query=list(dense), using="dense", limit=limit),
+            Prefetch(query=sparse, using="sparse", limit=limit),
+        ],
+        "query": FusionQuery(fusion=Fusion.RRF),
+        "limit": limit,
+        "with_payload": True,
+    }
+
+
+def _points_to_documents(points: list) -> list[Document]:
+    """Convert Qdrant points in LangChain payload layout to Documents."""
+    return [
+        Document(
+            page_content=p.payload.get("page_content", ""),
+            metadata=dict(p.payload.get("metadata") or {}),
+        ) for p in points if p.payload
+    ]
+
+
+def _apply_scores(documents: list[Document], scores: list[float]) -> None:
+    """Store rerank scores in metadata and sort documents by them."""
+    for doc, score in zip(documents, scores):
+        doc.metadata["relevance_score"] = float(score)
+    documents.sort(key=lambda d: d.metadata.get("relevance_score", 0), reverse=True)
 
 
 def _deduplicate_by_parent(documents: list[Document]) -> list[Document]:
     """Deduplicate by parent_id, keeping highest scored."""
-    parent_map: dict[str, Document] = {}
+    parent_map: dict[str, tuple[float, Document]] = {}
     
+    # Only remember the winning child; build the parent Document once at the end
     for doc in documents:
-        parent_id = doc.metadata.get("parent_id")
-        if not parent_id:
-            parent_map[str(id(doc))] = doc
-            continue
-        
-        parent_content = doc.metadata.get("parent_content", doc.page_content)
+        parent_id = doc.metadata.get("parent_id") or str(id(doc))
         score = doc.metadata.get("relevance_score", 0)
+        if parent_id not in parent_map or score > parent_map[parent_id][0]:
+            parent_map[parent_id] = (score, doc)
+    
+    parents = []
+    for _, doc in parent_map.values():
+        if not doc.metadata.get("parent_id"):
+            parents.append(doc)
+            continue
         
-        if parent_id not in parent_map or score > parent_map[parent_id].metadata.get("relevance_score", 0):
-            parent_map[parent_id] = Document(
-                page_content=parent_content,
-                metadata={k: v for k, v in doc.metadata.items() 
-                          if k not in ("parent_content", "chunk_index", "total_chunks")}
-            )
+        metadata = doc.metadata.copy()
+        parent_content = metadata.pop("parent_content", doc.page_content)
+        metadata.pop("chunk_index", None)
+        metadata.pop("total_chunks", None)
+        parents.append(Document(page_content=parent_content, metadata=metadata))
+    
+    return parents
+
+
+# Parent collections confirmed to exist, and when each miss was seen.
+# Misses expire because a later ingestion run may create the collection
+_PARENT_COLLECTIONS: set[str] = set()
+_PARENT_MISSES: dict[str, float] = {}
+_PARENT_MISS_TTL = 60.0
+
+
+def _cached_parent_exists(name: str) -> bool | None:
+    """Cached existence of a parent collection, or None when it must be checked."""
+    if name in _PARENT_COLLECTIONS:
+        return True
+    if time.monotonic() - _PARENT_MISSES.get(name, float("-inf")) < _PARENT_MISS_TTL:
+        return False
+    return None
+
+
+def _remember_parent_exists(name: str, exists: bool) -> bool:
+    """Record a parent collection existence check and return it."""
+    if exists:
+        _PARENT_COLLECTIONS.add(name)
+        _PARENT_MISSES.pop(name, None)
+    else:
+        _PARENT_MISSES[name] = time.monotonic()
+    return exists
+
+
+def _parent_point_ids(documents: list[Document]) -> list[str]:
+    """Parent collection point ids for the given deduplicated documents."""
+    return [make_point_id(d.metadata["parent_id"]) for d in documents if d.metadata.get("parent_id")]
+
+
+def _apply_parent_content(documents: list[Document], records: list) -> list[Document]:
+    """Swap child text for parent text fetched from the parent collection."""
+    contents = {
+        r.payload["metadata"]["parent_id"]: r.payload["page_content"]
+        for r in records if r.payload
+    }
+    missing = []
+    for doc in documents:
+        parent_id = doc.metadata.get("parent_id")
+        content = contents.get(parent_id)
+        if content is not None:
+            doc.page_content = content
+        elif parent_id:
+            missing.append(parent_id)
     
-    return list(parent_map.values())
+    if missing:
+        logger.warning("Parent chunks missing, answering from child text: %s", missing)
+    return documents
 
 
 class HybridRerankerRetriever(BaseRetriever):
@@ -93,69 +327,81 @@ class HybridRerankerRetriever(BaseRetriever):
     def _get_relevant_documents(
         self, query: str, *, run_manager: CallbackManagerForRetrieverRun | None = None
     ) -> list[Document]:
-        try:
-            results = self.vectorstore.similarity_search_with_score(query, k=self.top_k)
-            candidates = [doc for doc, _ in results]
-        except Exception:
-            candidates = self.vectorstore.similarity_search(query, k=self.top_k)
+        # Same dense + sparse RRF query the vector store runs in hybrid mode,
+        # but with cached query embeddings
+        client = self.vectorstore.client
+        collection = self.vectorstore.collection_name
+        results = client.query_points(**_hybrid_query(
+            collection, _embed_dense_query(query), _embed_sparse_query(query), self.top_k
+        ))
+        candidates = _points_to_documents(results.points)
         
         if not candidates:
             return []
         
         if self.reranker:
             pairs = [(query, doc.page_content) for doc in candidates]
-            for doc, score in zip(candidates, self.reranker.predict(pairs)):
-                doc.metadata["relevance_score"] = float(score)
-            candidates.sort(key=lambda d: d.metadata.get("relevance_score", 0), reverse=True)
+            _apply_scores(candidates, self.reranker.predict(pairs))
         
         parent_docs = _deduplicate_by_parent(candidates)
         parent_docs.sort(key=lambda d: d.metadata.get("relevance_score", 0), reverse=True)
-        return parent_docs[:self.top_n]
+        parent_docs = parent_docs[:self.top_n]
+        
+        # Collections ingested before the parent split have no parents
+        # collection and keep parent_content inline; the dedup result stands
+        parents = parent_collection_name(collection)
+        exists = _cached_parent_exists(parents)
+        if exists is None:
+            exists = _remember_parent_exists(parents, client.collection_exists(parents))
+        if not exists:
+            return parent_docs
+        
+        records = client.retrieve(
+            collection_name=parents, ids=_parent_point_ids(parent_docs), with_payload=True,
+        )
+        return _apply_parent_content(parent_docs, records)
     
     async def _aget_relevant_documents(
         self, query: str, *, run_manager: Any = None
     ) -> list[Document]:
-        loop = asyncio.get_event_loop()
-        async_client = AsyncQdrantClient(url=settings.qdrant_url)
+        loop = asyncio.get_running_loop()
+        async_client = get_retriever_async_client()
         
-        try:
-            dense_vector = await loop.run_in_executor(
-                None, get_dense_embedding().embed_query, query
-            )
-            
-            results = await async_client.query_points(
-                collection_name=settings.qdrant_collection,
-                query=dense_vector, using="dense",
-                limit=self.top_k, with_payload=True,
-            )
-            
-            candidates = [
-                Document(
-                    page_content=p.payload.get("page_content", ""),
-                    metadata={k: v for k, v in p.payload.items() if k != "page_content"}
-                ) for p in results.points if p.payload
-            ]
-            
-            if not candidates:
-                return []
-            
-            if self.reranker:
-                candidates = await loop.run_in_executor(
-                    None, self._sync_rerank, query, candidates
-                )
-            
-            parent_docs = _deduplicate_by_parent(candidates)
-            parent_docs.sort(key=lambda d: d.metadata.get("relevance_score", 0), reverse=True)
-            return parent_docs[:self.top_n]
-        finally:
-            await async_client.close()
-    
-    def _sync_rerank(self, query: str, docs: list[Document]) -> list[Document]:
-        pairs = [(query, doc.page_content) for doc in docs]
-        for doc, score in zip(docs, self.reranker.predict(pairs)):
-            doc.metadata["relevance_score"] = float(score)
-        docs.sort(key=lambda d: d.metadata.get("relevance_score", 0), reverse=True)
-        return docs
+        # The two encoders are independent, so run them side by side
+        dense_vector, sparse_vector = await asyncio.gather(
+            loop.run_in_executor(_EMBED_EXECUTOR, _embed_dense_query, query),
+            loop.run_in_executor(_EMBED_EXECUTOR, _embed_sparse_query, query),
+        )
+        
+        collection = self.vectorstore.collection_name
+        results = await async_client.query_points(
+            **_hybrid_query(collection, dense_vector, sparse_vector, self.top_k)
+        )
+        candidates = _points_to_documents(results.points)
+        
+        if not candidates:
+            return []
+        
+        if self.reranker:
+            # Concurrent queries share reranker forward passes
+            pairs = [(query, doc.page_content) for doc in candidates]
+            _apply_scores(candidates, await get_batched_reranker(self.reranker).predict(pairs))
+        
+        parent_docs = _deduplicate_by_parent(candidates)
+        parent_docs.sort(key=lambda d: d.metadata.get("relevance_score", 0), reverse=True)
+        parent_docs = parent_docs[:self.top_n]
+        
+        parents = parent_collection_name(collection)
+        exists = _cached_parent_exists(parents)
+        if exists is None:
+            exists = _remember_parent_exists(parents, await async_client.collection_exists(parents))
+        if not exists:
+            return parent_docs
+        
+        records = await async_client.retrieve(
+            collection_name=parents, ids=_parent_point_ids(parent_docs), with_payload=True,
+        )
+        return _apply_parent_content(parent_docs, records)
 
 
 def get_hybrid_retriever(
@@ -0,0 +1,167 @@
+"""Vietnamese legal text splitting by Điều/Khoản structure."""
+import re
+from functools import lru_cache
+
+from langchain_text_splitters import TextSplitter
+from langchain_core.documents import Document
+
+# Kept free of model, vector DB and settings imports: split workers import
+# this module to unpickle split_document and only need the regexes
+
+
+class VietnameseLegalTextSplitter(TextSplitter):
+    """Vietnamese legal document splitter by Điều/Khoản structure."""
+
+    # Compiled once and shared by all splitter instances
+    _article_re = re.compile(r"(Điều\s+\d+[a-zA-Z]?\.?\s*[^\n]*)", re.IGNORECASE)
+    _clause_re = re.compile(r"(\d+\.\s+)")
+    _chapter_re = re.compile(r"(Chương\s+[IVXLCDM\d]+\.?\s*[^\n]*)", re.IGNORECASE)
+    # Same heading anchored at a line start, without crossing lines
+    _article_line_re = re.compile(
+        r"^[^\S\n]*(Điều[^\S\n]+\d+[a-zA-Z]?\.?[^\n]*)", re.IGNORECASE | re.MULTILINE
+    )
+    # Sentence terminator plus the whitespace run that follows it
+    _sentence_end_re = re.compile(r"[.!?]\s+")
+
+    def __init__(self, chunk_size: int = 1500, chunk_overlap: int = 200):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def split_text(self, text: str) -> list[str]:
+        chunks = []
+        for article in self._split_by_articles(text):
+            if len(article) <= self._chunk_size:
+                chunks.append(article.strip())
+            else:
+                chunks.extend(self._split_by_clauses(article))
+        
+        chunks = [c for c in chunks if c.strip()]
+        return self._merge_small_chunks(chunks)
+
+    def _split_by_articles(self, text: str) -> list[str]:
+        matches = list(self._article_re.finditer(text))
+        if not matches:
+            return [text] if text.strip() else []
+        
+        # Search within (pos, endpos) bounds rather than slicing: each article
+        # is scanned for a chapter heading without copying it first
+        splits, chapter = [], ""
+        ch_match = self._chapter_re.search(text, 0, matches[0].start())
+        if ch_match:
+            chapter = ch_match.group(1).strip() + "\n\n"
+        
+        for i, m in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            article = text[m.start():end].strip()
+            if chapter:
+                article = chapter + article
+            
+            ch_match = self._chapter_re.search(text, m.start(), end)
+            if ch_match:
+                chapter = ch_match.group(1).strip() + "\n\n"
+            splits.append(article)
+        
+        return splits
+
+    def _split_by_clauses(self, article: str) -> list[str]:
+        header, remaining = "", article
+        
+        # First line that starts with an article heading becomes the header
+        header_match = self._article_line_re.search(article)
+        if header_match:
+            header = header_match.group(1).strip() + "\n"
+            line_end = article.find("\n", header_match.end())
+            remaining = article[line_end + 1:] if line_end != -1 else ""
+        
+        clause_matches = list(self._clause_re.finditer(remaining))
+        
+        if not clause_matches:
+            return self._fallback_split(article)
+        
+        chunks = []
+        for i, m in enumerate(clause_matches):
+            end = clause_matches[i + 1].start() if i + 1 < len(clause_matches) else len(remaining)
+            chunk = header + remaining[m.start():end].strip() if header else remaining[m.start():end].strip()
+            
+            if len(chunk) <= self._chunk_size:
+                chunks.append(chunk)
+            else:
+                chunks.extend(self._fallback_split(chunk))
+        
+        return chunks
+
+    def _split_sentences(self, text: str) -> list[str]:
+        # Slice at terminator matches instead of a lookbehind split, which
+        # re-tests the lookbehind at every whitespace position
+        sentences, start = [], 0
+        for m in self._sentence_end_re.finditer(text):
+            sentences.append(text[start:m.start() + 1])
+            start = m.end()
+        sentences.append(text[start:])
+        return sentences
+
+    def _fallback_split(self, text: str) -> list[str]:
+        sentences = self._split_sentences(text)
+        chunks, current = [], ""
+        
+        for s in sentences:
+            if len(current) + len(s) + 1 <= self._chunk_size:
+                current += (" " if current else "") + s
+            else:
+                if current:
+                    chunks.append(current.strip())
+                current = s
+        
+        if current:
+            chunks.append(current.strip())
+        return chunks
+
+    def _merge_small_chunks(self, chunks: list[str], min_size: int = 100) -> list[str]:
+        if not chunks:
+            return chunks
+        
+        merged, buffer = [], ""
+        for chunk in chunks:
+            if len(chunk) < min_size:
+                buffer = buffer + "\n\n" + chunk if buffer else chunk
+            else:
+                if buffer:
+                    merged.append(buffer)
+                    buffer = ""
+                merged.append(chunk)
+        
+        if buffer:
+            if merged:
+                merged[-1] += "\n\n" + buffer
+            else:
+                merged.append(buffer)
+        return merged
+
+
+@lru_cache(maxsize=8)
+def get_splitter(chunk_size: int, chunk_overlap: int) -> VietnameseLegalTextSplitter:
+    """Get a cached splitter instance for the given chunk config."""
+    return VietnameseLegalTextSplitter(chunk_size, chunk_overlap)
+
+
+def split_document(
+    doc: Document, parent_chunk: tuple[int, int], child_chunk: tuple[int, int]
+) -> list[Document]:
+    """Split one document into child chunks, carrying parent content in metadata until upload."""
+    parent_splitter = get_splitter(*parent_chunk)
+    child_splitter = get_splitter(*child_chunk)
+    
+    children = []
+    for p_idx, parent in enumerate(parent_splitter.split_text(doc.page_content)):
+        parent_id = f"{doc.metadata.get('_id', '')}_{p_idx}"
+        
+        for c_idx, child in enumerate(child_splitter.split_text(parent)):
+            children.append(Document(
+                page_content=child,
+                metadata={
+                    **doc.metadata,
+                    "parent_id": parent_id,
+                    "parent_content": parent,
+                    "chunk_index": c_idx,
+                }
+            ))
+    return children